@@ -1,14 +1,47 @@
 from flask import Flask, jsonify, request, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from flask_caching import Cache
+from sqlalchemy import update, or_, and_
 from datetime import datetime, timedelta
+from collections import deque
+import atexit
+import threading
+import time
 import config
-from models import db, User, Settings, AlertLog, CountLog
+from models import db, no_expire_on_commit, User, Settings, AlertLog, CountLog
 from camera import get_count, get_detections, generate_video_stream, start_camera, stop_camera
-from auth import login, register, verify, token_required, admin_required
+from auth import login, register, register_bulk, verify, token_required, admin_required
+
+# Optional fast JSON serializer - falls back to Flask's stdlib json provider
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for jsonify() and request.json"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 
 app = Flask(__name__)
+if ORJSON_AVAILABLE:
+    app.json = OrjsonProvider(app)
 app.config.from_object("config")
 db.init_app(app)
+cache = Cache(app)
 
 # Configure CORS
 CORS(app, resources={
@@ -19,6 +52,96 @@ CORS(app, resources={
     }
 })
 
+def _is_ok_response(rv):
+    """Only cache successful view responses"""
+    return isinstance(rv, tuple) and rv[1] == 200
+
+
+def _stats_cache_key():
+    """Cache key for /api/stats: the query string plus a generation bumped when alerts are cleared"""
+    generation = cache.get('stats_generation') or 0
+    return f"stats:{generation}:{request.query_string.decode('utf-8')}"
+
+
+# Cached crowd threshold so /api/count doesn't hit the settings table every poll
+_threshold_cache = {'value': None, 'exp': 0}
+
+
+def get_threshold():
+    """Get crowd threshold from settings, cached for THRESHOLD_CACHE_TTL seconds"""
+    if time.monotonic() < _threshold_cache['exp']:
+        return _threshold_cache['value']
+    
+    threshold_setting = db.session.get(Settings, 'crowd_threshold')
+    threshold = int(threshold_setting.value) if threshold_setting else config.THRESHOLD
+    
+    _threshold_cache['value'] = threshold
+    _threshold_cache['exp'] = time.monotonic() + config.THRESHOLD_CACHE_TTL
+    return threshold
+
+
+# Buffered CountLog/AlertLog rows, written in batches by a background thread.
+# Bounded so a long database outage can't grow memory without limit.
+_pending_counts = deque(maxlen=config.LOG_PENDING_MAX)
+_pending_alerts = deque(maxlen=config.LOG_PENDING_MAX)
+_log_writer_lock = threading.Lock()
+_log_writer_thread = None
+
+
+def _flush_pending(pending, model):
+    """Write buffered rows for one model to the database in batches"""
+    while pending:
+        batch = []
+        while pending and len(batch) < config.LOG_FLUSH_BATCH_SIZE:
+            batch.append(pending.popleft())
+        
+        try:
+            db.session.execute(model.__table__.insert(), batch)
+            db.session.commit()
+        except Exception:
+            # Put the batch back at the front so it is retried on the next flush
+            db.session.rollback()
+            pending.extendleft(reversed(batch))
+            raise
+
+
+def _flush_pending_logs():
+    """Write all buffered log rows to the database"""
+    _flush_pending(_pending_counts, CountLog)
+    _flush_pending(_pending_alerts, AlertLog)
+
+
+def _run_log_writer():
+    """Background loop that periodically flushes buffered logs"""
+    while True:
+        time.sleep(config.LOG_FLUSH_INTERVAL)
+        with app.app_context():
+            try:
+                _flush_pending_logs()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error flushing logs: {e}")
+
+
+@atexit.register
+def _flush_logs_on_exit():
+    """Write any still-buffered log rows before the process exits"""
+    with app.app_context():
+        try:
+            _flush_pending_logs()
+        except Exception as e:
+            print(f"Error flushing logs on exit: {e}")
+
+
+def start_log_writer():
+    """Start the background log writer thread if not already running"""
+    global _log_writer_thread
+    with _log_writer_lock:
+        if _log_writer_thread is None:
+            _log_writer_thread = threading.Thread(target=_run_log_writer, daemon=True)
+            _log_writer_thread.start()
+
+
 # ============================================================================
 # Authentication Endpoints
 # ============================================================================
@@ -33,7 +156,18 @@ def login_route():
 @admin_required
 def register_route():
     """User registration endpoint (admin only)"""
-    return register()
+    response = register()
+    cache.delete('users')
+    return response
+
+
+@app.route("/api/auth/register/bulk", methods=["POST"])
+@admin_required
+def register_bulk_route():
+    """Bulk user registration endpoint (admin only)"""
+    response = register_bulk()
+    cache.delete('users')
+    return response
 
 
 @app.route("/api/auth/verify", methods=["GET"])
@@ -51,33 +185,33 @@ def verify_route():
 def count_route():
     """Get current people count and alert status"""
     try:
+        now = datetime.utcnow()
         people_count = get_count()
         detections = get_detections()
         
-        # Get current threshold from settings
-        threshold_setting = Settings.query.filter_by(key='crowd_threshold').first()
-        threshold = int(threshold_setting.value) if threshold_setting else config.THRESHOLD
+        # Get current threshold from settings (cached)
+        threshold = get_threshold()
         
         # Check if alert should be triggered
         alert = people_count > threshold
         
-        # Log the count
-        count_log = CountLog(people_count=people_count)
-        db.session.add(count_log)
+        # Queue the count (and alert if triggered) for the background writer
+        start_log_writer()
+        _pending_counts.append({'people_count': people_count, 'timestamp': now})
         
-        # Log alert if triggered
         if alert:
-            alert_log = AlertLog(people_count=people_count, threshold=threshold)
-            db.session.add(alert_log)
-        
-        db.session.commit()
+            _pending_alerts.append({
+                'people_count': people_count,
+                'threshold': threshold,
+                'timestamp': now
+            })
         
         return jsonify({
             'count': people_count,
             'threshold': threshold,
             'alert': alert,
             'detections': detections,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': now.isoformat()
         }), 200
         
     except Exception as e:
@@ -106,21 +240,42 @@ def video_feed():
 def get_alerts():
     """Get alert history with optional filtering"""
     try:
-        # Get query parameters
-        limit = request.args.get('limit', 50, type=int)
-        hours = request.args.get('hours', 24, type=int)
+        # Get query parameters (clamped to keep each query bounded)
+        limit = max(1, min(request.args.get('limit', 50, type=int), config.MAX_ALERTS_LIMIT))
+        hours = max(1, min(request.args.get('hours', 24, type=int), config.MAX_HISTORY_HOURS))
+        before_ts = request.args.get('before_ts')
+        before_id = request.args.get('before_id', type=int)
         
         # Calculate time threshold
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
         
         # Query alerts
-        alerts = AlertLog.query.filter(
-            AlertLog.timestamp >= time_threshold
-        ).order_by(AlertLog.timestamp.desc()).limit(limit).all()
+        query = AlertLog.query.filter(AlertLog.timestamp >= time_threshold)
+        
+        # Keyset pagination: continue after the last (timestamp, id) of the previous page,
+        # so alerts sharing a timestamp across a page boundary are neither skipped nor repeated
+        if before_ts:
+            try:
+                cursor_ts = datetime.fromisoformat(before_ts)
+            except ValueError:
+                return jsonify({'message': 'Invalid before_ts, expected ISO 8601 timestamp'}), 400
+            
+            if before_id is not None:
+                query = query.filter(or_(
+                    AlertLog.timestamp < cursor_ts,
+                    and_(AlertLog.timestamp == cursor_ts, AlertLog.id < before_id)
+                ))
+            else:
+                query = query.filter(AlertLog.timestamp < cursor_ts)
+        
+        alerts = query.order_by(AlertLog.timestamp.desc(), AlertLog.id.desc()).limit(limit).all()
+        has_more = len(alerts) == limit
         
         return jsonify({
             'alerts': [alert.to_dict() for alert in alerts],
-            'count': len(alerts)
+            'count': len(alerts),
+            'next_before_ts': alerts[-1].timestamp.isoformat() if has_more else None,
+            'next_before_id': alerts[-1].id if has_more else None
         }), 200
         
     except Exception as e:
@@ -132,8 +287,11 @@ def get_alerts():
 def clear_alerts():
     """Clear all alert history (admin only)"""
     try:
-        AlertLog.query.delete()
+        db.session.query(AlertLog).delete(synchronize_session=False)
         db.session.commit()
+        
+        # Orphan all cached /api/stats responses so alert totals reflect the clear
+        cache.set('stats_generation', (cache.get('stats_generation') or 0) + 1, timeout=0)
         return jsonify({'message': 'Alert history cleared successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -146,37 +304,45 @@ def clear_alerts():
 
 @app.route("/api/stats", methods=["GET"])
 @token_required
+@cache.cached(timeout=15, key_prefix=_stats_cache_key, response_filter=_is_ok_response)
 def get_stats():
     """Get analytics and statistics"""
     try:
-        hours = request.args.get('hours', 24, type=int)
+        hours = max(1, min(request.args.get('hours', 24, type=int), config.MAX_HISTORY_HOURS))
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
         
-        # Get count logs
+        # Aggregate count statistics in the database
+        total_readings, avg_count, min_count, max_count = db.session.query(
+            db.func.count(CountLog.id),
+            db.func.avg(CountLog.people_count),
+            db.func.min(CountLog.people_count),
+            db.func.max(CountLog.people_count)
+        ).filter(CountLog.timestamp >= time_threshold).one()
+        
+        total_alerts = db.session.query(db.func.count(AlertLog.id)).filter(
+            AlertLog.timestamp >= time_threshold
+        ).scalar()
+        
+        # Fetch only the most recent rows, then restore chronological order
         count_logs = CountLog.query.filter(
             CountLog.timestamp >= time_threshold
-        ).order_by(CountLog.timestamp.asc()).all()
+        ).order_by(CountLog.timestamp.desc()).limit(100).all()
+        count_logs.reverse()
         
-        # Get alert logs
         alert_logs = AlertLog.query.filter(
             AlertLog.timestamp >= time_threshold
-        ).all()
-        
-        # Calculate statistics
-        counts = [log.people_count for log in count_logs]
-        avg_count = sum(counts) / len(counts) if counts else 0
-        max_count = max(counts) if counts else 0
-        min_count = min(counts) if counts else 0
+        ).order_by(AlertLog.timestamp.desc()).limit(20).all()
+        alert_logs.reverse()
         
         return jsonify({
             'period_hours': hours,
-            'total_readings': len(count_logs),
-            'total_alerts': len(alert_logs),
-            'average_count': round(avg_count, 2),
-            'max_count': max_count,
-            'min_count': min_count,
-            'count_history': [log.to_dict() for log in count_logs[-100:]],  # Last 100 readings
-            'recent_alerts': [alert.to_dict() for alert in alert_logs[-20:]]  # Last 20 alerts
+            'total_readings': total_readings,
+            'total_alerts': total_alerts,
+            'average_count': round(float(avg_count or 0), 2),
+            'max_count': max_count or 0,
+            'min_count': min_count or 0,
+            'count_history': [log.to_dict() for log in count_logs],  # Last 100 readings
+            'recent_alerts': [alert.to_dict() for alert in alert_logs]  # Last 20 alerts
         }), 200
         
     except Exception as e:
@@ -189,11 +355,12 @@ def get_stats():
 
 @app.route("/api/settings", methods=["GET"])
 @token_required
+@cache.cached(timeout=30, key_prefix='settings', response_filter=_is_ok_response)
 def get_settings():
     """Get all settings"""
     try:
-        settings = Settings.query.all()
-        settings_dict = {s.key: s.value for s in settings}
+        # Only key/value are needed, so skip building full ORM objects
+        settings_dict = dict(db.session.query(Settings.key, Settings.value).all())
         
         # Add defaults if not in database
         if 'crowd_threshold' not in settings_dict:
@@ -217,22 +384,36 @@ def update_settings():
         if not data:
             return jsonify({'message': 'No data provided'}), 400
         
-        updated_settings = []
-        
-        for key, value in data.items():
-            setting = Settings.query.filter_by(key=key).first()
-            
-            if setting:
-                setting.value = str(value)
-                setting.updated_at = datetime.utcnow()
-            else:
-                setting = Settings(key=key, value=str(value))
-                db.session.add(setting)
-            
-            updated_settings.append(key)
+        updated_settings = list(data.keys())
+        now = datetime.utcnow()
+        
+        # Find which settings already exist in one query
+        existing_keys = {
+            row.key for row in db.session.query(Settings.key).filter(Settings.key.in_(updated_settings)).all()
+        }
+        
+        # One bulk UPDATE for existing keys, one bulk INSERT for new ones
+        updates = [
+            {'key': key, 'value': str(value), 'updated_at': now}
+            for key, value in data.items() if key in existing_keys
+        ]
+        inserts = [
+            {'key': key, 'value': str(value), 'updated_at': now}
+            for key, value in data.items() if key not in existing_keys
+        ]
+        
+        if updates:
+            db.session.execute(update(Settings), updates)
+        if inserts:
+            db.session.execute(Settings.__table__.insert(), inserts)
         
         db.session.commit()
         
+        # Invalidate cached settings so the new values apply immediately
+        cache.delete('settings')
+        if 'crowd_threshold' in data:
+            _threshold_cache['exp'] = 0
+        
         return jsonify({
             'message': 'Settings updated successfully',
             'updated': updated_settings
@@ -249,6 +430,7 @@ def update_settings():
 
 @app.route("/api/users", methods=["GET"])
 @admin_required
+@cache.cached(timeout=60, key_prefix='users', response_filter=_is_ok_response)
 def get_users():
     """Get all users (admin only)"""
     try:
@@ -285,9 +467,11 @@ def update_user(user_id):
         data = request.json
         
         if 'username' in data:
-            # Check if username is already taken
-            existing = User.query.filter_by(username=data['username']).first()
-            if existing and existing.id != user_id:
+            # Check if username is already taken by another user
+            existing = db.session.query(User.id).filter(
+                User.username == data['username'], User.id != user_id
+            ).first()
+            if existing:
                 return jsonify({'message': 'Username already exists'}), 400
             user.username = data['username']
         
@@ -299,7 +483,9 @@ def update_user(user_id):
                 return jsonify({'message': 'Invalid role'}), 400
             user.role = data['role']
         
-        db.session.commit()
+        with no_expire_on_commit(db.session()):
+            db.session.commit()
+        cache.delete('users')
         
         return jsonify({
             'message': 'User updated successfully',
@@ -326,6 +512,7 @@ def delete_user(user_id):
         
         db.session.delete(user)
         db.session.commit()
+        cache.delete('users')
         
         return jsonify({'message': 'User deleted successfully'}), 200
         
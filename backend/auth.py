@@ -1,30 +1,43 @@
 from flask import request, jsonify
-from functools import wraps
+from functools import wraps, lru_cache
+import time
 import jwt
 from datetime import datetime, timedelta
-from models import User, db
+from models import User, db, no_expire_on_commit
 import config
 
 def generate_token(user_id, role):
     """Generate JWT access token"""
+    now = datetime.utcnow()
     payload = {
         'user_id': user_id,
         'role': role,
-        'exp': datetime.utcnow() + config.JWT_ACCESS_TOKEN_EXPIRES,
-        'iat': datetime.utcnow()
+        'exp': now + config.JWT_ACCESS_TOKEN_EXPIRES,
+        'iat': now
     }
     return jwt.encode(payload, config.JWT_SECRET_KEY, algorithm='HS256')
 
 
+@lru_cache(maxsize=1024)
+def _decode_token(token):
+    """Decode JWT token, memoized on the raw token string"""
+    return jwt.decode(token, config.JWT_SECRET_KEY, algorithms=['HS256'])
+
+
 def verify_token(token):
     """Verify and decode JWT token"""
     try:
-        payload = jwt.decode(token, config.JWT_SECRET_KEY, algorithms=['HS256'])
-        return payload
+        payload = _decode_token(token)
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    
+    # Cache hits skip jwt's own expiry check, so re-check it here
+    exp = payload.get('exp')
+    if exp is not None and exp <= time.time():
+        return None
+    return payload
 
 
 def token_required(f):
@@ -117,7 +130,8 @@ def register():
         user.set_password(data['password'])
         
         db.session.add(user)
-        db.session.commit()
+        with no_expire_on_commit(db.session()):
+            db.session.commit()
         
         return jsonify({
             'message': 'User created successfully',
@@ -129,6 +143,59 @@ def register():
         return jsonify({'message': f'Registration error: {str(e)}'}), 500
 
 
+def register_bulk():
+    """Handle bulk user registration (admin only)"""
+    try:
+        data = request.json
+        
+        if not isinstance(data, list) or not data:
+            return jsonify({'message': 'A non-empty list of users is required'}), 400
+        
+        # Each bcrypt hash blocks the worker, so keep a single request bounded
+        if len(data) > config.MAX_BULK_REGISTER:
+            return jsonify({'message': f'At most {config.MAX_BULK_REGISTER} users per request'}), 400
+        
+        for entry in data:
+            if not isinstance(entry, dict) or 'username' not in entry or 'password' not in entry or 'role' not in entry:
+                return jsonify({'message': 'Username, password, and role required for every user'}), 400
+            if not all(isinstance(entry[field], str) for field in ('username', 'password', 'role')):
+                return jsonify({'message': 'Username, password, and role must be strings'}), 400
+            if entry['role'] not in ['admin', 'user']:
+                return jsonify({'message': 'Invalid role. Must be admin or user'}), 400
+        
+        usernames = [entry['username'] for entry in data]
+        if len(set(usernames)) != len(usernames):
+            return jsonify({'message': 'Duplicate usernames in request'}), 400
+        
+        # Check all usernames against the database in one query
+        existing = db.session.query(User.username).filter(User.username.in_(usernames)).all()
+        if existing:
+            return jsonify({
+                'message': 'Username already exists',
+                'existing': [row.username for row in existing]
+            }), 400
+        
+        # Insert all users in a single executemany
+        db.session.execute(User.__table__.insert(), [
+            {
+                'username': entry['username'],
+                'password_hash': User.hash_password(entry['password']),
+                'role': entry['role']
+            }
+            for entry in data
+        ])
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Users created successfully',
+            'created': usernames
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Registration error: {str(e)}'}), 500
+
+
 def verify():
     """Verify token validity"""
     try:
@@ -1,6 +1,8 @@
 import os
+import queue
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 # Conditional import for camera - won't crash if cv2 unavailable
@@ -11,20 +13,42 @@ except ImportError:
     CV2_AVAILABLE = False
     print("WARNING: OpenCV not available. Running in mock mode.")
 
-from detect import detect_people
+# Optional SIMD JPEG encoder - falls back to cv2.imencode if libturbojpeg is missing
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    tj = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except Exception:
+    TURBOJPEG_AVAILABLE = False
+
+from detect import detect_people, annotate, inference_backend
 import config
 
+# Optional GPU JPEG encoder (pynvjpeg), only probed when detection already runs on CUDA
+NVJPEG_AVAILABLE = False
+if inference_backend == "cuda":
+    try:
+        from nvjpeg import NvJpeg
+        nj = NvJpeg()
+        NVJPEG_AVAILABLE = True
+    except Exception:
+        pass
+
 # Detect if running in cloud environment (no camera hardware)
 CLOUD_MODE = os.getenv("CLOUD_MODE", "false").lower() == "true" or not CV2_AVAILABLE
 
+# Multipart framing for the MJPEG stream, yielded around each frame without concatenation
+_BOUNDARY_HEAD = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+_BOUNDARY_TAIL = b'\r\n'
+
 class CameraManager:
     """Manage camera capture and people detection"""
     
     def __init__(self):
         self.cap = None
-        self.latest_count = 0
-        self.latest_frame = None
-        self.latest_detections = []
+        # (count, detections, frame, jpeg) - replaced as a whole, never mutated, so readers need no lock
+        self.latest_result = (0, [], None, None)
+        self.subscribers = set()
         self.is_running = False
         self.lock = threading.Lock()
         self.camera_source = config.CAMERA_SOURCE
@@ -80,6 +104,48 @@ class CameraManager:
                 return False
 
     
+    def _fit_frame(self, frame):
+        """Downscale frames larger than the configured capture size, keeping aspect ratio"""
+        h, w = frame.shape[:2]
+        scale = min(config.CAMERA_WIDTH / w, config.CAMERA_HEIGHT / h)
+        if scale >= 1.0:
+            return frame
+        
+        size = (int(w * scale), int(h * scale))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def _encode_frame(self, frame):
+        """Encode a frame as JPEG bytes, or None if encoding is unavailable"""
+        if NVJPEG_AVAILABLE:
+            return nj.encode(frame, config.JPEG_QUALITY)
+        
+        if TURBOJPEG_AVAILABLE:
+            return tj.encode(frame, quality=config.JPEG_QUALITY, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+        
+        if not CV2_AVAILABLE:
+            return None
+        
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), config.JPEG_QUALITY])
+        return buffer.tobytes() if ret else None
+
+    def _publish_frame(self, frame_bytes):
+        """Push JPEG bytes to every stream subscriber, dropping the oldest if full (caller holds lock)"""
+        if frame_bytes is None:
+            return
+        
+        for subscriber in self.subscribers:
+            try:
+                subscriber.put_nowait(frame_bytes)
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(frame_bytes)
+                except queue.Full:
+                    pass
+
     def start(self):
         """Start background capture thread"""
         if self.is_running:
@@ -100,52 +166,110 @@ class CameraManager:
         self.release_camera()
         print("Camera background thread stopped")
 
+    def _process_frame(self, frame):
+        """Run detection on a frame, annotate and encode it, and publish the result"""
+        try:
+            count, detections, frame = detect_people(frame)
+            
+            # The capture thread owns this frame, so boxes are drawn in place without a copy
+            annotated_frame = annotate(frame, detections)
+            
+            # Encode once here so stream clients don't each re-encode the frame
+            frame_bytes = self._encode_frame(annotated_frame)
+            
+            # Update latest values with a single atomic reference swap
+            self.latest_result = (count, detections, annotated_frame, frame_bytes)
+            with self.lock:
+                self._publish_frame(frame_bytes)
+        except Exception as e:
+            print(f"Error in background detection: {e}")
+
     def _run_capture(self):
         """Internal loop for background capture and detection"""
-        while not self.stop_event.is_set():
-            # In cloud mode, generate mock data
-            if CLOUD_MODE:
-                # Create a simple mock frame (640x480 black image with text)
-                mock_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-                if CV2_AVAILABLE:
-                    cv2.putText(mock_frame, "CLOUD MODE - No Camera", (120, 240),
-                              cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        # Only every Nth source frame is decoded and run through detection
+        source_fps = config.CAMERA_FPS
+        sample_every = 1
+        frames_to_skip = 0
+        is_file = False
+        sampled_cap = None
+        mock_result = None
+        
+        # Detection runs on a worker so the next frame is decoded while the current one is inferred
+        pending = None
+        
+        with ThreadPoolExecutor(max_workers=1) as detector:
+            while not self.stop_event.is_set():
+                # In cloud mode, generate mock data
+                if CLOUD_MODE:
+                    # The mock frame never changes, so render and encode it only once
+                    if mock_result is None:
+                        # Create a simple mock frame (640x480 black image with text)
+                        mock_frame = np.zeros((480, 640, 3), dtype=np.uint8)
+                        if CV2_AVAILABLE:
+                            cv2.putText(mock_frame, "CLOUD MODE - No Camera", (120, 240),
+                                      cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                        mock_result = (0, [], mock_frame, self._encode_frame(mock_frame))  # Mock count
+                    
+                    frame_bytes = mock_result[3]
+                    self.latest_result = mock_result
+                    with self.lock:
+                        self._publish_frame(frame_bytes)
+                    
+                    time.sleep(1.0)
+                    continue
                 
-                with self.lock:
-                    self.latest_count = 0  # Mock count
-                    self.latest_frame = mock_frame
-                    self.latest_detections = []
+                if self.cap is None or not self.cap.isOpened():
+                    if not self.initialize_camera():
+                        time.sleep(1)
+                        continue
                 
-                time.sleep(1.0)
-                continue
-            
-            if self.cap is None or not self.cap.isOpened():
-                if not self.initialize_camera():
+                # Re-derive the sampling rate whenever a new source is opened
+                if self.cap is not sampled_cap:
+                    sampled_cap = self.cap
+                    # Drivers report 0 when the source rate is unknown
+                    source_fps = self.cap.get(cv2.CAP_PROP_FPS) or config.CAMERA_FPS
+                    sample_every = max(1, round(source_fps / config.DETECT_FPS))
+                    frames_to_skip = sample_every - 1
+                    is_file = self.cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+                
+                started = time.monotonic()
+                
+                # grab() advances the stream without decoding; only the sampled frame is retrieved
+                grabbed = True
+                for _ in range(frames_to_skip + 1):
+                    grabbed = self.cap.grab()
+                    if not grabbed:
+                        break
+                
+                ret, frame = self.cap.retrieve() if grabbed else (False, None)
+                
+                if not ret or frame is None:
+                    print("Error reading frame, attempting to reconnect...")
+                    self.release_camera()
                     time.sleep(1)
                     continue
-            
-            ret, frame = self.cap.read()
-            
-            if not ret or frame is None:
-                print("Error reading frame, attempting to reconnect...")
-                self.release_camera()
-                time.sleep(1)
-                continue
-            
-            # Perform detection with bounding boxes
-            try:
-                count, detections, annotated_frame = detect_people(frame, draw_boxes=True)
                 
-                # Update latest values
-                with self.lock:
-                    self.latest_count = count
-                    self.latest_frame = annotated_frame
-                    self.latest_detections = detections
-            except Exception as e:
-                print(f"Error in background detection: {e}")
-            
-            # Control frame rate
-            time.sleep(1.0 / config.CAMERA_FPS)
+                # Sources that ignore CAP_PROP_FRAME_WIDTH/HEIGHT (RTSP, files) may deliver larger frames
+                frame = self._fit_frame(frame)
+                
+                # Wait for the previous frame's detection before handing over this one
+                waited = 0.0
+                if pending is not None:
+                    wait_started = time.monotonic()
+                    pending.result()
+                    waited = time.monotonic() - wait_started
+                
+                # Perform detection with bounding boxes
+                pending = detector.submit(self._process_frame, frame)
+                
+                # Skip further ahead if detection is slower than the sampling interval
+                frames_to_skip = max(sample_every - 1, int(waited * source_fps))
+                
+                # Live sources are paced by grab() and must never sleep, or their backlog never drains;
+                # video files decode as fast as possible, so hold them to real time
+                if is_file:
+                    elapsed = time.monotonic() - started
+                    time.sleep(max(0.0, sample_every / source_fps - elapsed))
 
     def release_camera(self):
         """Release camera resources"""
@@ -155,59 +279,53 @@ class CameraManager:
     
     def get_count(self):
         """Get latest people count"""
-        with self.lock:
-            return self.latest_count
+        return self.latest_result[0]
     
     def get_frame(self):
         """Get latest frame"""
-        with self.lock:
-            return self.latest_frame
+        return self.latest_result[2]
     
     def get_detections(self):
         """Get latest detection details"""
-        with self.lock:
-            return self.latest_detections
-    
-    def update_detection(self):
-        """No-op in threaded version, data is updated in background"""
-        pass
+        return self.latest_result[1]
     
     def generate_frames(self):
-        """Generate frames for video streaming from latest results"""
-        while True:
-            # If not running, start the background thread
-            if not self.is_running:
-                self.start()
-            
+        """Generate frames for video streaming from the capture thread's output"""
+        # If not running, start the background thread
+        if not self.is_running:
+            self.start()
+        
+        # Register a per-client queue; the capture thread fans frames out to it
+        frames = queue.Queue(maxsize=2)
+        with self.lock:
+            self.subscribers.add(frames)
+            latest_jpeg = self.latest_result[3]
+            if latest_jpeg is not None:
+                frames.put_nowait(latest_jpeg)
+        
+        try:
+            while True:
+                try:
+                    frame_bytes = frames.get(timeout=1.0)
+                except queue.Empty:
+                    if not self.is_running:
+                        self.start()
+                    continue
+                
+                # Yield frame in multipart format
+                yield _BOUNDARY_HEAD
+                yield frame_bytes
+                yield _BOUNDARY_TAIL
+        finally:
             with self.lock:
-                annotated_frame = self.latest_frame.copy() if self.latest_frame is not None else None
-            
-            if annotated_frame is None:
-                time.sleep(0.1)
-                continue
-            
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', annotated_frame)
-            
-            if not ret:
-                time.sleep(0.1)
-                continue
-            
-            frame_bytes = buffer.tobytes()
-            
-            # Yield frame in multipart format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-            # Small delay to keep streaming smooth
-            time.sleep(1.0 / config.CAMERA_FPS)
+                self.subscribers.discard(frames)
 
 
 # Global camera manager instance
 camera_manager = CameraManager()
 
 def get_count():
-    """Get current people count"""
+    """Get current people count from the background detection cache"""
     # Ensure background thread is running
     if not camera_manager.is_running:
         camera_manager.start()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 # Flask Configuration
@@ -6,20 +7,60 @@ SECRET_KEY = os.getenv("SECRET_KEY", "crowd_secret_key_change_in_production")
 SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///database.db")
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Connection pool sized for concurrent pollers plus video stream threads
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,  # seconds
+}
+
+# In-memory SQLite uses StaticPool, which rejects pool sizing options
+_IN_MEMORY_SQLITE = SQLALCHEMY_DATABASE_URI.startswith("sqlite") and (
+    SQLALCHEMY_DATABASE_URI in ("sqlite://", "sqlite:///:memory:")
+    or "mode=memory" in SQLALCHEMY_DATABASE_URI
+)
+if not _IN_MEMORY_SQLITE:
+    SQLALCHEMY_ENGINE_OPTIONS["pool_size"] = int(os.getenv("DB_POOL_SIZE", "20"))
+    SQLALCHEMY_ENGINE_OPTIONS["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+
+# Background Log Writer Configuration
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))  # seconds
+LOG_FLUSH_BATCH_SIZE = int(os.getenv("LOG_FLUSH_BATCH_SIZE", "1000"))
+LOG_PENDING_MAX = int(os.getenv("LOG_PENDING_MAX", "100000"))  # rows buffered per table before oldest are dropped
+
+# Response Cache Configuration (Flask-Caching)
+# Must be shared across gunicorn workers so invalidation on writes reaches all of them:
+# FileSystemCache for a single host, or e.g. RedisCache (with CACHE_REDIS_URL) for several
+CACHE_TYPE = os.getenv("CACHE_TYPE", "FileSystemCache")
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(tempfile.gettempdir(), "crowd-management-cache"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_DEFAULT_TIMEOUT = 30
+
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "jwt_secret_key_change_in_production")
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
 JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
 
+# Password Hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 # Crowd Detection Configuration
 THRESHOLD = int(os.getenv("CROWD_THRESHOLD", "10"))
 DETECTION_CONFIDENCE = float(os.getenv("DETECTION_CONFIDENCE", "0.5"))
+MAX_ALERTS_LIMIT = 500
+MAX_BULK_REGISTER = int(os.getenv("MAX_BULK_REGISTER", "20"))
+MAX_HISTORY_HOURS = 24 * 30
+THRESHOLD_CACHE_TTL = float(os.getenv("THRESHOLD_CACHE_TTL", "5"))  # seconds
 
 # Camera Configuration
 CAMERA_SOURCE = os.getenv("CAMERA_SOURCE", "0")  # 0 for USB, or RTSP URL
 CAMERA_WIDTH = int(os.getenv("CAMERA_WIDTH", "640"))
 CAMERA_HEIGHT = int(os.getenv("CAMERA_HEIGHT", "480"))
 CAMERA_FPS = int(os.getenv("CAMERA_FPS", "30"))
+# Frames per second decoded and run through detection. Only these frames are annotated and
+# streamed, so this also caps the /api/video-feed frame rate (raise it toward CAMERA_FPS for
+# a smoother stream at the cost of more decode and inference work)
+DETECT_FPS = int(os.getenv("DETECT_FPS", "10"))
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "80"))
 
 # CORS Configuration
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
@@ -27,3 +68,6 @@ CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
 # Model Paths
 MODEL_PROTOTXT = "models/MobileNetSSD_deploy.prototxt"
 MODEL_WEIGHTS = "models/MobileNetSSD_deploy.caffemodel"
+# Optional INT8-quantized ONNX export of MobileNet-SSD, run with ONNX Runtime when set
+MODEL_ONNX = os.getenv("MODEL_ONNX", "")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "auto").lower()  # auto, cuda, opencl, cpu
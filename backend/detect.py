@@ -4,20 +4,107 @@ import os
 import config
 import threading
 
+# Optional ONNX Runtime backend for INT8-quantized models
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
 CLASSES = ["background", "aeroplane", "bicycle", "bird", "boat",
            "bottle", "bus", "car", "cat", "chair", "cow", "diningtable",
            "dog", "horse", "motorbike", "person", "pottedplant", "sheep",
            "sofa", "train", "tvmonitor"]
+PERSON_IDX = CLASSES.index("person")
 
 # Load model with error handling
 net = None
+session = None
+session_input = None
+onnx_failed = False
 model_loaded = False
+inference_backend = "cpu"
+
+def _select_backend(net):
+    """Pick the fastest available DNN backend (CUDA > OpenCL > CPU) unless overridden"""
+    backend = config.INFERENCE_BACKEND
+    
+    if backend == "auto":
+        try:
+            has_cuda = cv2.cuda.getCudaEnabledDeviceCount() > 0
+        except (AttributeError, cv2.error):
+            has_cuda = False
+        
+        if has_cuda:
+            backend = "cuda"
+        elif cv2.ocl.haveOpenCL():
+            backend = "opencl"
+        else:
+            backend = "cpu"
+    
+    if backend == "cuda":
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA_FP16)
+    elif backend == "opencl":
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL_FP16)
+    else:
+        backend = "cpu"
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    
+    return backend
+
+def _load_onnx_model():
+    """Load a quantized ONNX MobileNet-SSD into ONNX Runtime, if configured"""
+    global session, session_input, onnx_failed
+    
+    if not config.MODEL_ONNX or not ORT_AVAILABLE or onnx_failed:
+        return False
+    
+    if not os.path.exists(config.MODEL_ONNX):
+        print(f"Warning: ONNX model not found at {config.MODEL_ONNX}, falling back to Caffe")
+        return False
+    
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    available = ort.get_available_providers()
+    providers = [p for p in ("OpenVINOExecutionProvider", "CPUExecutionProvider") if p in available]
+    
+    try:
+        session = ort.InferenceSession(config.MODEL_ONNX, sess_options=options, providers=providers)
+        session_input = session.get_inputs()[0].name
+        
+        # Warm up and check the output is SSD DetectionOutput-shaped (rows of 7 values)
+        output = session.run(None, {session_input: np.zeros((1, 3, 300, 300), dtype=np.float32)})[0]
+        if output.shape[-1] != 7:
+            raise ValueError(f"unexpected output shape {output.shape}, expected (..., 7)")
+    except Exception as e:
+        # Don't retry a broken ONNX model on every frame; use Caffe from now on
+        print(f"Warning: Failed to load ONNX model {config.MODEL_ONNX} ({e}), falling back to Caffe")
+        session = None
+        session_input = None
+        onnx_failed = True
+        return False
+    
+    return True
+
+def _warmup():
+    """Run one Caffe forward pass on the fixed 1x3x300x300 input so layer setup happens at load, not on the first frame"""
+    net.setInput(np.zeros((1, 3, 300, 300), dtype=np.float32))
+    net.forward()
 
 def load_model():
     """Load MobileNet-SSD model"""
-    global net, model_loaded
+    global net, model_loaded, inference_backend
     
     try:
+        if _load_onnx_model():
+            inference_backend = "onnxruntime"
+            model_loaded = True
+            print(f"MobileNet-SSD ONNX model loaded successfully (backend: {inference_backend})")
+            return True
+        
         if not os.path.exists(config.MODEL_PROTOTXT):
             print(f"Warning: Model prototxt not found at {config.MODEL_PROTOTXT}")
             return False
@@ -27,8 +114,10 @@ def load_model():
             return False
         
         net = cv2.dnn.readNetFromCaffe(config.MODEL_PROTOTXT, config.MODEL_WEIGHTS)
+        inference_backend = _select_backend(net)
+        _warmup()
         model_loaded = True
-        print("MobileNet-SSD model loaded successfully")
+        print(f"MobileNet-SSD model loaded successfully (backend: {inference_backend})")
         return True
     except Exception as e:
         print(f"Error loading model: {e}")
@@ -41,13 +130,105 @@ load_model()
 # Global lock for thread-safe inference
 model_lock = threading.Lock()
 
+def _forward(blob):
+    """Run the SSD forward pass, returning detections shaped (1, 1, N, 7)"""
+    if session is not None:
+        # Quantized QDQ graphs take the same float32 blob and quantize it internally
+        detections = session.run(None, {session_input: blob})[0]
+        return detections.reshape(1, 1, -1, 7)
+    
+    net.setInput(blob)
+    return net.forward()
+
+# SSD preprocessing: resize to 300x300, subtract 127.5 from every channel and scale to [-1, 1]
+BLOB_SIZE = (300, 300)
+BLOB_SCALE = 0.007843
+BLOB_MEAN = (127.5, 127.5, 127.5)
+
+# OpenCV >= 4.9 can write the blob into a preallocated array instead of allocating one per frame
+if hasattr(cv2.dnn, "blobFromImageWithParams"):
+    _blob_params = cv2.dnn.Image2BlobParams()
+    _blob_params.scalefactor = (BLOB_SCALE,) * 3
+    _blob_params.size = BLOB_SIZE
+    _blob_params.mean = BLOB_MEAN
+    _blob_params.swapRB = False
+    _blob_params.ddepth = cv2.CV_32F
+else:
+    _blob_params = None
+
+# Preprocessing runs outside model_lock, so each thread gets its own buffer
+_blob_buffers = threading.local()
+
+def _make_blob(frame):
+    """Build the (1, 3, 300, 300) float32 network input for a BGR frame"""
+    if _blob_params is None:
+        return cv2.dnn.blobFromImage(frame, BLOB_SCALE, BLOB_SIZE, BLOB_MEAN, swapRB=False, crop=False)
+    
+    buf = getattr(_blob_buffers, "blob", None)
+    if buf is None:
+        buf = _blob_buffers.blob = np.empty((1, 3) + BLOB_SIZE[::-1], dtype=np.float32)
+    return cv2.dnn.blobFromImageWithParams(frame, buf, _blob_params)
+
+# Confidence labels are pre-rendered once (0.00-1.00) and blitted, instead of rasterizing glyphs per box
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 0.5
+LABEL_THICKNESS = 2
+LABEL_COLOR = (0, 255, 0)
+
+def _render_label_sprite(text):
+    """Render text to a boolean mask, returning (mask, baseline origin offset from top)"""
+    pad = LABEL_THICKNESS
+    (text_w, text_h), baseline = cv2.getTextSize(text, LABEL_FONT, LABEL_SCALE, LABEL_THICKNESS)
+    canvas = np.zeros((text_h + baseline + 2 * pad, text_w + 2 * pad), dtype=np.uint8)
+    cv2.putText(canvas, text, (pad, text_h + pad), LABEL_FONT, LABEL_SCALE, 255, LABEL_THICKNESS)
+    return canvas > 0, text_h + pad
+
+_label_sprites = [_render_label_sprite(f"Person: {i / 100:.2f}") for i in range(101)]
+
+def _draw_label(frame, confidence, x, y):
+    """Blit the pre-rendered label for confidence with its text origin at (x, y), clipped to the frame"""
+    mask, origin_y = _label_sprites[min(100, max(0, int(round(confidence * 100))))]
+    top, left = y - origin_y, x - LABEL_THICKNESS
+    h, w = frame.shape[:2]
+    
+    y0, x0 = max(top, 0), max(left, 0)
+    y1, x1 = min(top + mask.shape[0], h), min(left + mask.shape[1], w)
+    if y0 >= y1 or x0 >= x1:
+        return
+    
+    frame[y0:y1, x0:x1][mask[y0 - top:y1 - top, x0 - left:x1 - left]] = LABEL_COLOR
+
+def annotate(frame, detections_list):
+    """
+    Draw detection boxes and confidence labels onto a frame in place
+    
+    Args:
+        frame: Frame to draw on (modified in place)
+        detections_list: Detections as returned by detect_people
+    
+    Returns:
+        The same frame, for convenience
+    """
+    for detection in detections_list:
+        bbox = detection['bbox']
+        startX, startY = bbox['x1'], bbox['y1']
+        
+        # Draw rectangle
+        cv2.rectangle(frame, (startX, startY), (bbox['x2'], bbox['y2']), LABEL_COLOR, 2)
+        
+        # Draw label with confidence
+        y = startY - 15 if startY - 15 > 15 else startY + 15
+        _draw_label(frame, detection['confidence'], startX, y)
+    
+    return frame
+
 def detect_people(frame, draw_boxes=False, confidence_threshold=None):
     """
     Detect people in a frame using MobileNet-SSD
     
     Args:
         frame: Input image frame
-        draw_boxes: Whether to draw bounding boxes on the frame
+        draw_boxes: Whether to draw bounding boxes on a copy of the frame
         confidence_threshold: Minimum confidence for detection (uses config default if None)
     
     Returns:
@@ -60,76 +241,55 @@ def detect_people(frame, draw_boxes=False, confidence_threshold=None):
         confidence_threshold = config.DETECTION_CONFIDENCE
         
     try:
-        # Use a lock to ensure thread-safe access to the model
+        h, w = frame.shape[:2]
+        
+        # Create blob from image (resized to 300x300 internally)
+        blob = _make_blob(frame)
+        
+        # Only the model itself needs the lock; pre/post-processing runs outside it
         with model_lock:
             if not model_loaded:
                 # Try to load model again
                 if not load_model():
                     return 0, [], frame
             
-            h, w = frame.shape[:2]
-            
-            # Create blob from image
-            blob = cv2.dnn.blobFromImage(
-                cv2.resize(frame, (300, 300)), 
-                0.007843,
-                (300, 300), 
-                127.5
-            )
-            
             # Set input and forward pass
-            net.setInput(blob)
-            detections = net.forward()
-            
-            count = 0
-            detections_list = []
-            annotated_frame = frame.copy() if draw_boxes else frame
-            
-            # Process detections
-            for i in range(detections.shape[2]):
-                confidence = detections[0, 0, i, 2]
-                
-                if confidence > confidence_threshold:
-                    idx = int(detections[0, 0, i, 1])
-                    
-                    if idx < len(CLASSES) and CLASSES[idx] == "person":
-                        count += 1
-                        
-                        # Get bounding box coordinates
-                        box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                        
-                        # Handle NaN/Inf and clip coordinates to frame boundaries
-                        # This prevents the "Illegal instruction: 4" crash on macOS
-                        box = np.nan_to_num(box, nan=0, posinf=0, neginf=0)
-                        startX = int(max(0, min(w - 1, box[0])))
-                        startY = int(max(0, min(h - 1, box[1])))
-                        endX = int(max(0, min(w - 1, box[2])))
-                        endY = int(max(0, min(h - 1, box[3])))
-                        
-                        # Store detection info
-                        detections_list.append({
-                            'confidence': float(confidence),
-                            'bbox': {
-                                'x1': startX,
-                                'y1': startY,
-                                'x2': endX,
-                                'y2': endY
-                            }
-                        })
-                        
-                        # Draw bounding box if requested
-                        if draw_boxes:
-                            # Draw rectangle
-                            cv2.rectangle(annotated_frame, (startX, startY), (endX, endY), (0, 255, 0), 2)
-                            
-                            # Draw label with confidence
-                            label = f"Person: {confidence:.2f}"
-                            y = startY - 15 if startY - 15 > 15 else startY + 15
-                            cv2.putText(annotated_frame, label, (startX, y),
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            
-            return count, detections_list, annotated_frame
-            
+            detections = _forward(blob)
+        
+        # Select confident person detections in one vectorized pass
+        d = detections[0, 0]
+        mask = (d[:, 2] > confidence_threshold) & (d[:, 1] == PERSON_IDX)
+        count = int(mask.sum())
+        
+        # Get bounding box coordinates (float32 to match the SSD output, no upcast)
+        scale_xyxy = np.array([w, h, w, h], dtype=np.float32)
+        boxes = d[mask, 3:7] * scale_xyxy
+        
+        # Handle NaN/Inf and clip coordinates to frame boundaries
+        # This prevents the "Illegal instruction: 4" crash on macOS
+        boxes = np.nan_to_num(boxes, nan=0, posinf=0, neginf=0)
+        boxes = np.clip(boxes, 0, scale_xyxy - 1).astype(np.int32)
+        
+        # Store detection info
+        detections_list = [
+            {
+                'confidence': float(confidence),
+                'bbox': {
+                    'x1': startX,
+                    'y1': startY,
+                    'x2': endX,
+                    'y2': endY
+                }
+            }
+            for confidence, (startX, startY, endX, endY) in zip(d[mask, 2].tolist(), boxes.tolist())
+        ]
+        
+        # Only copy the frame when there is something to draw on it
+        if not draw_boxes or count == 0:
+            return count, detections_list, frame
+        
+        return count, detections_list, annotate(frame.copy(), detections_list)
+        
     except Exception as e:
         print(f"Error in detection: {e}")
         return 0, [], frame
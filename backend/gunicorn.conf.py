@@ -0,0 +1,34 @@
+"""
+Gunicorn Configuration
+Gevent workers in CLOUD_MODE so long-lived /api/video-feed streams don't pin an OS thread each.
+With a local camera, capture and DNN inference are blocking native code that would freeze a
+gevent hub, so threaded (gthread) workers are used instead.
+"""
+
+import os
+
+CLOUD_MODE = os.getenv("CLOUD_MODE", "false").lower() == "true"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+timeout = 120
+
+if CLOUD_MODE:
+    worker_class = "gevent"
+    workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+    worker_connections = int(os.getenv("WORKER_CONNECTIONS", "200"))
+else:
+    # Each worker runs its own capture thread, so a single worker owns the camera
+    worker_class = "gthread"
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperative when running against PostgreSQL under gevent"""
+    if not CLOUD_MODE:
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
@@ -3,6 +3,7 @@ Database Initialization Script
 Creates database tables and seeds initial data
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from app import app, db
 from models import User, Settings
 import config
@@ -16,32 +17,39 @@ def init_database():
         db.create_all()
         print("✓ Tables created successfully")
         
-        # Check if admin user already exists
+        # create_all() skips existing tables, so add any indexes they are missing
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+        print("✓ Indexes up to date")
+        
+        # Check which default users already exist
         admin = User.query.filter_by(username='admin').first()
+        test_user = User.query.filter_by(username='user').first()
+        
+        # Hash passwords in parallel - bcrypt releases the GIL
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            admin_hash = pool.submit(User.hash_password, 'admin123') if not admin else None
+            user_hash = pool.submit(User.hash_password, 'user123') if not test_user else None
         
         if not admin:
             print("\nCreating default admin user...")
-            admin = User(username='admin', role='admin')
-            admin.set_password('admin123')
+            admin = User(username='admin', role='admin', password_hash=admin_hash.result())
             db.session.add(admin)
             print("✓ Admin user created (username: admin, password: admin123)")
         else:
             print("\n✓ Admin user already exists")
         
-        # Check if test user exists
-        test_user = User.query.filter_by(username='user').first()
-        
         if not test_user:
             print("Creating default test user...")
-            test_user = User(username='user', role='user')
-            test_user.set_password('user123')
+            test_user = User(username='user', role='user', password_hash=user_hash.result())
             db.session.add(test_user)
             print("✓ Test user created (username: user, password: user123)")
         else:
             print("✓ Test user already exists")
         
         # Create default settings
-        threshold_setting = Settings.query.filter_by(key='crowd_threshold').first()
+        threshold_setting = db.session.get(Settings, 'crowd_threshold')
         if not threshold_setting:
             print("\nCreating default settings...")
             threshold_setting = Settings(key='crowd_threshold', value=str(config.THRESHOLD))
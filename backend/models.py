@@ -1,9 +1,50 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextlib import contextmanager
 from datetime import datetime
 import bcrypt
+import sqlite3
+import config
+
+# Optional gevent support - bcrypt is CPU-bound native code that never yields to the hub
+try:
+    from gevent import monkey as gevent_monkey, get_hub as gevent_get_hub
+    GEVENT_AVAILABLE = True
+except ImportError:
+    GEVENT_AVAILABLE = False
 
 db = SQLAlchemy()
 
+
+def _run_blocking(fn, *args):
+    """Run blocking native code on a real OS thread under gevent so other connections keep being served"""
+    if GEVENT_AVAILABLE and gevent_monkey.is_module_patched('threading'):
+        return gevent_get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    """Use WAL with relaxed fsync on SQLite so log writes don't serialize readers"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+@contextmanager
+def no_expire_on_commit(sess):
+    """Keep instances loaded after commit so serializing them needs no re-SELECT"""
+    prev = sess.expire_on_commit
+    sess.expire_on_commit = False
+    try:
+        yield sess
+    finally:
+        sess.expire_on_commit = prev
+
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -13,13 +54,19 @@ class User(db.Model):
     role = db.Column(db.String(10), nullable=False)  # admin / user
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    @staticmethod
+    def hash_password(password):
+        """Hash a password with bcrypt"""
+        salt = bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)
+        return _run_blocking(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+    
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = User.hash_password(password)
     
     def check_password(self, password):
         """Verify password against hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return _run_blocking(bcrypt.checkpw, password.encode('utf-8'), self.password_hash.encode('utf-8'))
     
     def to_dict(self):
         """Convert user to dictionary"""
@@ -34,8 +81,7 @@ class User(db.Model):
 class Settings(db.Model):
     __tablename__ = 'settings'
     
-    id = db.Column(db.Integer, primary_key=True)
-    key = db.Column(db.String(50), unique=True, nullable=False)
+    key = db.Column(db.String(50), primary_key=True)
     value = db.Column(db.String(200), nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -49,6 +95,7 @@ class Settings(db.Model):
 
 class AlertLog(db.Model):
     __tablename__ = 'alert_logs'
+    __table_args__ = (db.Index('ix_alertlog_ts', 'timestamp'),)
     
     id = db.Column(db.Integer, primary_key=True)
     people_count = db.Column(db.Integer, nullable=False)
@@ -66,6 +113,7 @@ class AlertLog(db.Model):
 
 class CountLog(db.Model):
     __tablename__ = 'count_logs'
+    __table_args__ = (db.Index('ix_countlog_ts', 'timestamp'),)
     
     id = db.Column(db.Integer, primary_key=True)
     people_count = db.Column(db.Integer, nullable=False)